@@ -13,30 +13,99 @@ What You'll Learn:
 Prerequisites: Complete part-3 (SQLAlchemy)
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import msgspec
+import orjson
+from flask import (
+    Flask, Response, abort, render_template, request, redirect, url_for,
+    flash, jsonify, stream_with_context
+)
+from flask.json.provider import DefaultJSONProvider
+from flask_caching import Cache
+from flask_compress import Compress
+from sqlalchemy import event, insert
+from sqlalchemy.orm import joinedload
 from models import db, Author, Book
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson instead of the stdlib json module.
+
+    orjson serializes large lists of dicts several times faster than the
+    default provider, so every jsonify() call below gets the speedup
+    without any changes to the routes themselves.
+    """
+
+    def dumps(self, obj, **kwargs):
+        # orjson returns bytes; Flask's provider expects a string
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)  # jsonify() now uses orjson
 app.secret_key = "secret-key"
 
 # Database configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///books.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Connection pool settings (same idea as part-5)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': 10,  # Number of connections to keep open
+    'pool_recycle': 3600,  # Recycle connections after 1 hour
+    'pool_pre_ping': True,  # Check connection validity before using
+}
+
 db.init_app(app)
 
+with app.app_context():
+    @event.listens_for(db.engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Tune SQLite on every new connection.
+
+        - WAL journal lets readers keep going while a write is in progress
+          (the default rollback journal blocks them)
+        - busy_timeout makes a locked connection wait up to 5s instead of
+          failing immediately with "database is locked"
+        - synchronous=NORMAL skips an fsync per transaction; safe with WAL
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+# In-memory cache for the book list (swap CACHE_TYPE for RedisCache etc.
+# in production). Write routes call cache.delete() to invalidate.
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 60})
+
+# Compress responses when the client advertises support (Accept-Encoding).
+# JSON compresses very well - book lists shrink to a fraction of their
+# size - and brotli/zstd beat gzip on both ratio and speed.
+app.config['COMPRESS_ALGORITHM'] = ['zstd', 'br', 'gzip']
+app.config['COMPRESS_MIMETYPES'] = [
+    'text/html', 'application/json', 'application/x-ndjson'
+]
+Compress(app)
+
 # ======================= HTML UI =======================
 
 @app.route('/')
 def index():
     authors = Author.query.all()
-    books = Book.query.all()
+    # joinedload fetches each book's author in the same query,
+    # instead of one extra SELECT per book (the "N+1 problem")
+    books = Book.query.options(joinedload(Book.author)).all()
 
-    edit_author_id = request.args.get('edit_author')
-    edit_book_id = request.args.get('edit_book')
+    edit_author_id = request.args.get('edit_author', type=int)
+    edit_book_id = request.args.get('edit_book', type=int)
 
-    edit_author = Author.query.get(edit_author_id) if edit_author_id else None
-    edit_book = Book.query.get(edit_book_id) if edit_book_id else None
+    # The row being edited is already in the lists above - pick it out
+    # instead of running two more SELECTs (Query.get is also deprecated)
+    edit_author = next((a for a in authors if a.id == edit_author_id), None)
+    edit_book = next((b for b in books if b.id == edit_book_id), None)
 
     return render_template(
         'index.html',
@@ -54,27 +123,45 @@ def add_author():
     bio = request.form.get('bio')
     city = request.form.get('city')
 
+    # db.session is a proxy that resolves the current request's session
+    # on every access; grab the real session once and reuse it
+    session = db.session()
     new_author = Author(name=name, bio=bio, city=city)
-    db.session.add(new_author)
-    db.session.commit()
+    session.add(new_author)
+    session.commit()
+    invalidate_books_cache()
     flash("Author added successfully!")
     return redirect(url_for('index'))
 
 @app.route('/update-author/<int:id>', methods=['POST'])
 def update_author(id):
-    author = Author.query.get_or_404(id)
+    session = db.session()
+    author = session.get(Author, id)
+    if author is None:
+        abort(404)
     author.name = request.form['name']
     author.bio = request.form.get('bio')
     author.city = request.form.get('city')
-    db.session.commit()
+    # Keep the denormalized copy on the books table in sync
+    session.query(Book).filter_by(author_id=id).update({'author_name': author.name})
+    session.commit()
+    invalidate_books_cache()
     flash("Author updated successfully!")
     return redirect(url_for('index'))
 
-@app.route('/delete-author/<int:id>')
+@app.route('/delete-author/<int:id>', methods=['POST'])
 def delete_author(id):
-    author = Author.query.get_or_404(id)
-    db.session.delete(author)
-    db.session.commit()
+    # POST, not GET: deletes change data, so they must not be reachable
+    # by link prefetchers or crawlers. Two bulk DELETE statements replace
+    # loading the author plus one ORM delete per cascaded book.
+    session = db.session()
+    session.query(Book).filter_by(author_id=id).delete()
+    deleted = session.query(Author).filter_by(id=id).delete()
+    if not deleted:
+        session.rollback()
+        abort(404)
+    session.commit()
+    invalidate_books_cache()
     flash("Author deleted successfully!")
     return redirect(url_for('index'))
 
@@ -84,91 +171,332 @@ def delete_author(id):
 def add_book():
     title = request.form['title']
     isbn = request.form['isbn']
-    author_id = int(request.form['author_id'])
-
-    new_book = Book(title=title, isbn=isbn, author_id=author_id)
-    db.session.add(new_book)
-    db.session.commit()
+    # type=int returns None on junk instead of raising ValueError
+    author_id = request.form.get('author_id', type=int)
+    if author_id is None:
+        abort(400, description="'author_id' must be an integer")
+
+    session = db.session()
+    author = session.get(Author, author_id)
+    if author is None:
+        abort(404)
+    new_book = Book(title=title, isbn=isbn, author_id=author_id,
+                    author_name=author.name)
+    session.add(new_book)
+    session.commit()
+    invalidate_books_cache()
     flash("Book added successfully!")
     return redirect(url_for('index'))
 
 @app.route('/update-book/<int:id>', methods=['POST'])
 def update_book(id):
-    book = Book.query.get_or_404(id)
+    author_id = request.form.get('author_id', type=int)
+    if author_id is None:
+        abort(400, description="'author_id' must be an integer")
+    session = db.session()
+    book = session.get(Book, id)
+    author = session.get(Author, author_id)
+    if book is None or author is None:
+        abort(404)
     book.title = request.form['title']
     book.isbn = request.form['isbn']
-    book.author_id = int(request.form['author_id'])
-    db.session.commit()
+    book.author_id = author_id
+    book.author_name = author.name
+    session.commit()
+    invalidate_books_cache()
     flash("Book updated successfully!")
     return redirect(url_for('index'))
 
-@app.route('/delete-book/<int:id>')
+@app.route('/delete-book/<int:id>', methods=['POST'])
 def delete_book(id):
-    book = Book.query.get_or_404(id)
-    db.session.delete(book)
-    db.session.commit()
+    # Single DELETE ... WHERE id = ? - no SELECT needed first
+    session = db.session()
+    deleted = session.query(Book).filter_by(id=id).delete()
+    if not deleted:
+        session.rollback()
+        abort(404)
+    session.commit()
+    invalidate_books_cache()
     flash("Book deleted successfully!")
     return redirect(url_for('index'))
 
 # ================= REST APIs =================
 
+# The API only returns four fields, so select exactly those columns
+# instead of full Book/Author entities. The ORM then skips building and
+# tracking objects per row - rows come back as plain named tuples.
+# author_name is the denormalized copy on the books table, so the read
+# endpoints don't need to join authors at all.
+BOOK_COLUMNS = (Book.id, Book.title, Book.isbn, Book.author_name.label('author'))
+
+
+class BookOut(msgspec.Struct):
+    """Response shape of a book row.
+
+    msgspec compiles the encoder for this fixed set of fields once at
+    class definition, so serializing skips the per-key dict work that
+    generic JSON encoders repeat on every request.
+    """
+    id: int
+    title: str
+    isbn: str | None
+    author: str | None
+
+
+@cache.cached(key_prefix='api_books_payload')
+def get_books_payload():
+    """Book list as BookOut structs - cached so repeat reads skip the DB."""
+    books = Book.query.with_entities(*BOOK_COLUMNS).all()
+    return [BookOut(b.id, b.title, b.isbn, b.author) for b in books]
+
+
+def invalidate_books_cache():
+    """Call after any write that changes what the book list APIs return."""
+    cache.delete('api_books_payload')
+    cache.delete_many(*(
+        f'api_books_sorted_{sort}_{order}'
+        for sort in SORTABLE for order in ('asc', 'desc')
+    ))
+
+
 @app.route('/api/books')
 def api_books():
-    books = Book.query.all()
-    return jsonify([
-        {
-            "id": b.id,
-            "title": b.title,
-            "isbn": b.isbn,
-            "author": b.author.name
-        } for b in books
-    ])
+    response = Response(msgspec.json.encode(get_books_payload()),
+                        mimetype='application/json')
+    # ETag lets clients revalidate: if their copy matches, we answer
+    # 304 Not Modified with an empty body instead of resending the list
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/api/books/<int:id>')
+def api_book(id):
+    b = Book.query.with_entities(*BOOK_COLUMNS).filter(Book.id == id).first()
+    if b is None:
+        abort(404)
+    return Response(msgspec.json.encode(BookOut(b.id, b.title, b.isbn, b.author)),
+                    mimetype='application/json')
+
+
+@app.route('/api/books-stream')
+def api_books_stream():
+    # NDJSON (one JSON object per line) streamed straight from the DB
+    # cursor. jsonify() builds the whole list in memory before sending a
+    # single byte; here the first book goes out as soon as it's read, and
+    # yield_per keeps only a small batch of rows in memory at a time.
+    def generate():
+        query = Book.query.with_entities(*BOOK_COLUMNS).yield_per(100)
+        for b in query:
+            yield orjson.dumps(
+                {"id": b.id, "title": b.title, "isbn": b.isbn, "author": b.author}
+            ) + b"\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# Built once at import; SQLAlchemy caches the compiled SQL string, so
+# each request only binds parameters instead of rendering the INSERT
+BOOK_INSERT = insert(Book)
+
 
 @app.route('/api/add-book', methods=['POST'])
 def api_add_book():
     data = request.get_json()
-    new_book = Book(title=data['title'], isbn=data['isbn'], author_id=data['author_id'])
-    db.session.add(new_book)
-    db.session.commit()
-    return jsonify({"success": True})
+    session = db.session()
+    author = session.get(Author, data['author_id'])
+    if author is None:
+        abort(404)
+    # Core insert skips the ORM unit of work (no Book object to build,
+    # track and refresh) - it's just the statement plus bound values
+    result = session.execute(BOOK_INSERT.values(
+        title=data['title'],
+        isbn=data['isbn'],
+        author_id=data['author_id'],
+        author_name=author.name,
+    ))
+    session.commit()
+    invalidate_books_cache()
+
+    # 201 + Location tells the client exactly where the new resource
+    # lives, so it doesn't need a follow-up list request to find it
+    book_id = result.inserted_primary_key[0]
+    response = jsonify({"success": True, "id": book_id})
+    response.status_code = 201
+    response.headers['Location'] = url_for('api_book', id=book_id)
+    return response
+
+@app.route('/api/add-books', methods=['POST'])
+def api_add_books():
+    # Bulk insert: one executemany statement for the whole batch instead
+    # of a session.add + flush per book. Body: {"books": [{"title": ...,
+    # "isbn": ..., "author_id": ...}, ...]}
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({
+            "success": False,
+            "error": "Body must be an object like {\"books\": [...]}"
+        }), 400
+    books = data.get('books', [])
+    if not books:
+        return jsonify({"success": False, "error": "No books given"}), 400
+    for b in books:
+        if not isinstance(b, dict) or 'title' not in b or 'author_id' not in b:
+            return jsonify({
+                "success": False,
+                "error": "Each book must be an object with 'title' and 'author_id'"
+            }), 400
+
+    session = db.session()
+    # Resolve all author names for the batch with one IN query and stamp
+    # the denormalized author_name onto each mapping
+    author_ids = {b['author_id'] for b in books}
+    names = dict(
+        session.query(Author.id, Author.name).filter(Author.id.in_(author_ids)).all()
+    )
+    # Same rule as /api/add-book's get_or_404: don't insert books that
+    # point at authors that don't exist
+    unknown = sorted(author_ids - set(names))
+    if unknown:
+        return jsonify({
+            "success": False,
+            "error": f"Unknown author_id(s): {', '.join(map(str, unknown))}"
+        }), 404
+
+    for b in books:
+        b['author_name'] = names[b['author_id']]
+    session.bulk_insert_mappings(Book, books)
+    session.commit()
+    invalidate_books_cache()
+
+    response = jsonify({"success": True, "inserted": len(books)})
+    response.status_code = 201
+    response.headers['Location'] = url_for('api_books')
+    return response
 
 # ================= PAGINATION =================
 
+# Upper bound on page size so one request can't ask for the whole table
+MAX_PER_PAGE = 100
+
+
+def get_int_arg(name, default=None):
+    """Parse ?name= as an int once, answering 400 on junk like ?name=abc.
+
+    request.args.get(type=int) silently swallows bad values and returns
+    the default, which hides client bugs; failing fast is cheaper than
+    re-coercing and guessing downstream.
+    """
+    raw = request.args.get(name)
+    if raw is None:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        abort(400, description=f"'{name}' must be an integer")
+
+
 @app.route('/api/books-with-pagination')
 def api_books_paginated():
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 5, type=int)
-
-    pagination = Book.query.paginate(page=page, per_page=per_page)
-    return jsonify({
-        "total": pagination.total,
-        "pages": pagination.pages,
+    # Keyset (cursor) pagination: instead of page numbers + OFFSET, the
+    # client passes the last id it saw (?after=<id>) and we continue from
+    # there. OFFSET has to skip all earlier rows, so deep pages get slower
+    # and slower; "WHERE id > :after LIMIT n" stays fast on any page.
+    after = get_int_arg('after')
+    per_page = min(max(get_int_arg('per_page', 5), 1), MAX_PER_PAGE)
+
+    query = Book.query.with_entities(*BOOK_COLUMNS).order_by(Book.id.asc())
+    if after is not None:
+        query = query.filter(Book.id > after)
+
+    # Fetch one extra row just to learn whether another page exists -
+    # that single boolean is all the metadata a cursor client needs, so
+    # there's no COUNT(*) (or "total pages") anywhere on this path
+    books = query.limit(per_page + 1).all()
+    has_more = len(books) > per_page
+    books = books[:per_page]
+    next_cursor = books[-1].id if has_more else None
+
+    response = jsonify({
         "books": [
-            {"id": b.id, "title": b.title, "isbn": b.isbn, "author": b.author.name}
-            for b in pagination.items
-        ]
+            {"id": b.id, "title": b.title, "isbn": b.isbn, "author": b.author}
+            for b in books
+        ],
+        "per_page": per_page,
+        "has_more": has_more,
+        "next": next_cursor
     })
+    # Cursor values make the key space unbounded, so this endpoint skips
+    # the payload cache the other list endpoints use; an ETag still lets
+    # clients revalidate a page they already hold
+    response.add_etag()
+    return response.make_conditional(request)
 
 # ================= SORTING =================
 
+# Only these columns may be sorted on - each one is indexed (see models.py).
+# getattr(Book, sort) would accept *any* attribute name from the client,
+# including unindexed columns or things that aren't columns at all.
+SORTABLE = {"title": Book.title, "isbn": Book.isbn, "id": Book.id}
+
+
 @app.route('/api/books-with-sorting')
 def api_books_sorting():
     sort = request.args.get('sort', 'title')
     order = request.args.get('order', 'asc')
 
-    column = getattr(Book, sort, Book.title)
-    books = Book.query.order_by(column.desc() if order == 'desc' else column.asc()).all()
-
-    return jsonify([
-        {"id": b.id, "title": b.title, "isbn": b.isbn, "author": b.author.name}
-        for b in books
-    ])
+    if sort not in SORTABLE:
+        abort(400, description=f"'sort' must be one of: {', '.join(SORTABLE)}")
+    if order not in ('asc', 'desc'):
+        abort(400, description="'order' must be 'asc' or 'desc'")
+
+    # Only six valid sort/order combinations exist, so each encoded
+    # payload gets its own cache slot; the write routes clear them all
+    # through invalidate_books_cache()
+    cache_key = f'api_books_sorted_{sort}_{order}'
+    body = cache.get(cache_key)
+    if body is None:
+        column = SORTABLE[sort]
+        # id as tie-breaker gives a stable, repeatable order for equal values
+        books = Book.query.with_entities(*BOOK_COLUMNS).order_by(
+            column.desc() if order == 'desc' else column.asc(), Book.id.asc()
+        ).all()
+        body = msgspec.json.encode(
+            [BookOut(b.id, b.title, b.isbn, b.author) for b in books]
+        )
+        cache.set(cache_key, body)
+
+    response = Response(body, mimetype='application/json')
+    response.add_etag()
+    return response.make_conditional(request)
 
 # ================= RUN =================
 
+def upgrade_db():
+    """Bring a pre-existing books.db up to date with the current models.
+
+    db.create_all() only creates missing tables - it never alters
+    existing ones - so a database created before books.author_name was
+    added needs the column bolted on and backfilled from authors.
+    """
+    columns = [
+        row[1]
+        for row in db.session.execute(db.text("PRAGMA table_info('books')"))
+    ]
+    if 'author_name' not in columns:
+        db.session.execute(db.text(
+            'ALTER TABLE books ADD COLUMN author_name VARCHAR(100)'
+        ))
+    db.session.execute(db.text(
+        'UPDATE books SET author_name = ('
+        '  SELECT name FROM authors WHERE authors.id = books.author_id'
+        ') WHERE author_name IS NULL'
+    ))
+    db.session.commit()
+
+
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()
+        upgrade_db()
     app.run(debug=True)
 
 
@@ -0,0 +1,23 @@
+"""
+ASGI entry point for the part-4 API
+===================================
+Flask's built-in server (app.run) handles one request per thread, which
+limits throughput when many API clients hit the JSON endpoints at once.
+Wrapping the app with asgiref's WsgiToAsgi lets an ASGI server like
+uvicorn manage all connections on an event loop while the Flask handlers
+run in a thread pool.
+
+Install: pip install asgiref uvicorn
+Run:     uvicorn asgi:asgi_app --workers 4
+"""
+
+from asgiref.wsgi import WsgiToAsgi
+from app import app, db, upgrade_db
+
+# Same startup work `python app.py` does: create missing tables and
+# bring an older books.db up to the current schema
+with app.app_context():
+    db.create_all()
+    upgrade_db()
+
+asgi_app = WsgiToAsgi(app)
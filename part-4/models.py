@@ -23,6 +23,20 @@ class Book(db.Model):
     title = db.Column(db.String(200), nullable=False)
     isbn = db.Column(db.String(20))
     author_id = db.Column(db.Integer, db.ForeignKey('authors.id'), nullable=False)
+    # Denormalized copy of Author.name so the read-heavy API endpoints
+    # can serve book rows without joining authors. The write routes in
+    # app.py keep it in sync when books move or an author is renamed.
+    author_name = db.Column(db.String(100))
+
+    # Indexes on the sortable columns let ORDER BY read rows in index
+    # order instead of sorting the whole table on every request
+    __table_args__ = (
+        db.Index('ix_books_title', 'title'),
+        db.Index('ix_books_isbn', 'isbn'),
+        # Covers "books by this author, ordered by title" in one index
+        # scan - filtering on author_id and sorting on title together
+        db.Index('ix_books_author_id_title', 'author_id', 'title'),
+    )
 
     def __repr__(self):
         return f"<Book {self.title}>"